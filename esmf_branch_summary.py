@@ -119,6 +119,7 @@ def main():
         _job.processor.BranchSummaryGateway(
             git_artifacts, git_summaries, archive, compass
         ),
+        workers=args.jobs,
     )
     logging.info(
         "itterating over %s branches in %s machines over %s most recent commits",
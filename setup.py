@@ -32,7 +32,7 @@ setup(
     author_email="ryan.long@noaa.gov",
     url="",
     py_modules=["esmf-branch-summary"],
-    install_requires=["tabulate"],
+    install_requires=[],
     tests_require=["pytest"],
     license="MIT",
     package_dir={"": "src"},
@@ -14,6 +14,12 @@ NA = "N/A"
 # Defaults
 DEFAULT_FILE_ENCODING = "ISO-8859-1"
 DEFAULT_TEMP_SPACE_NAME = "esmf_branch_summary_space"
+DEFAULT_WORKTREE_SPACE_NAME = "esmf_branch_summary_worktrees"
+DEFAULT_WRITE_BUFFER_SIZE = 128 * 1024
+
+# bump whenever parsing or the summary output changes, so summaries recorded
+# by an older version are regenerated instead of skipped
+SNAPSHOT_VERSION = 1
 
 # Repositories
 REPO_ESMF_TEST_ARTIFACTS = "https://github.com/esmf-org/esmf-test-artifacts"
@@ -24,21 +30,20 @@ _PROD_REPO = "git@github.com:esmf-org/esmf-test-summary.git"
 REPO_ESMF_BRANCH_SUMMARY = _PROD_REPO if is_prod else _DEV_REPO
 
 # Machines
-MACHINE_NAME_LIST = sorted(
-    [
-        "cori",
-        "cheyenne",
-        "hera",
-        "orion",
-        "jet",
-        "gaea",
-        "discover",
-        "chianti",
-        "catania",
-        "acorn",
-        "gaffney",
-        "izumi",
-        # "koehr",
-        "onyx",
-    ]
+# kept in sorted order
+MACHINE_NAME_LIST = (
+    "acorn",
+    "catania",
+    "cheyenne",
+    "chianti",
+    "cori",
+    "discover",
+    "gaea",
+    "gaffney",
+    "hera",
+    "izumi",
+    "jet",
+    # "koehr",
+    "onyx",
+    "orion",
 )
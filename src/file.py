@@ -5,18 +5,19 @@ author: Ryan Long <ryan.long@noaa.gov>
 """
 
 import abc
-import collections
-import functools
 import os
 import pathlib
 import logging
-from typing import Any, Dict, Generator, List
+import operator
+import re
+from typing import Any, Dict, Generator, List, Optional
 
 from src import constants
 
 
-def _replace(old: str, new: str, target: str):
-    return target.replace(old, new)
+def clean_test_results_value(value: str) -> str:
+    """strips the PASS/FAIL labels and newlines from a test results value"""
+    return value.replace("PASS", "").replace("FAIL", "").replace("\n", "").strip()
 
 
 class ReadOnly(abc.ABC):
@@ -31,7 +32,7 @@ class ReadOnly(abc.ABC):
         with open(
             self.file_path, "r", encoding=constants.DEFAULT_FILE_ENCODING
         ) as _file:
-            yield _file.readline()
+            yield from _file
 
 
 class Summary(ReadOnly):
@@ -58,20 +59,20 @@ class Summary(ReadOnly):
 
     def __init__(self, file_path: pathlib.Path):
         super().__init__(file_path)
-        self.data = self.fetch_test_results()
+        self._data: Optional[Dict[str, Any]] = None
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """test results, read from file_path on first use"""
+        if self._data is None:
+            self._data = self.fetch_test_results()
+        return self._data
 
     def __dir__(self):
         return list(self.__dict__.keys()) + self.PROPS
 
     def fetch_test_results(self) -> Dict[str, Any]:
         """Fetches test results from file_path and returns them as an ordered dict"""
-
-        def clean_value(value):
-            delete_carriage_returns = functools.partial(_replace, "\n", "")
-            return delete_carriage_returns(
-                value.replace("PASS", "").replace("FAIL", "")
-            ).strip()
-
         results = {}
         for line in self.content:
             # Build for = gfortran_10.3.0_mpich3_g_develop, mpi version 8.1.7 on acorn esmf_os: Linux
@@ -84,7 +85,7 @@ class Summary(ReadOnly):
                 key_cleaned = key.split(None, 1)[0]
 
                 try:
-                    value = clean_value(value)
+                    value = clean_test_results_value(value)
                     pass_, fail_ = value.split(None, 1)
                     pass_ = int(pass_.strip())
                     fail_ = int(fail_.strip())
@@ -105,9 +106,12 @@ class Summary(ReadOnly):
         return results
 
 
+_ARTIFACTS_LINK_PREFIX = f"[artifacts]({constants.REPO_ESMF_TEST_ARTIFACTS}/tree/"
+
+
 def generate_link(**kwds) -> str:
     """generates a link to github to jump to the _hash passed in"""
-    return f"[artifacts]({constants.REPO_ESMF_TEST_ARTIFACTS}/tree/{kwds['hash']}/{kwds['path']})"
+    return "".join((_ARTIFACTS_LINK_PREFIX, kwds["hash"], "/", kwds["path"], ")"))
 
 
 def generate_link_old(**kwds) -> str:
@@ -115,68 +119,58 @@ def generate_link_old(**kwds) -> str:
     return f"[artifacts]({constants.REPO_ESMF_TEST_ARTIFACTS}/tree/{kwds['host'].replace('/', '_')}/{kwds['branch'].replace('/', '_')}/{kwds['host'].replace('/', '_')}/{kwds['compiler']}/{kwds['c_version']}/{kwds['o_g']}/{kwds['mpi']}/{kwds['m_version'].lower()})"
 
 
+# same column order as the archive's ORDER BY
+_SUMMARY_SORT_KEY = operator.itemgetter(
+    "branch", "host", "compiler", "c_version", "mpi", "m_version", "o_g"
+)
+
+
 def sort_file_summary_content(data: List[Any]) -> List[Any]:
     """sorts the summary file contents"""
-    return sorted(
-        data,
-        key=lambda x: x["branch"]
-        + x["host"]
-        + x["compiler"]
-        + x["c_version"]
-        + x["mpi"]
-        + x["m_version"]
-        + x["o_g"],
-    )
+    return sorted(data, key=_SUMMARY_SORT_KEY)
 
 
-def extract_build_attributes(line: str) -> Dict[str, Any]:
-    """extracs build atrributes when found in file_path"""
-    _temp = {}
-    results = collections.OrderedDict()
-    line_cleaned = line.split("=", 1)[1].strip()
-    group1, group2 = line_cleaned.split(",", 1)
-    try:
-        (
-            group1,
-            group2,
-        ) = line_cleaned.split(",", 1)
-
-        (
-            _temp["compiler"],
-            _temp["c_version"],
-            _temp["mpi"],
-            _temp["o_g"],
-        ) = group1.strip().split("_")[0:4]
-
-        (_temp["branch"],) = group1.strip().split("_", 4)[4:]
-
-        (
-            _,
-            _,
-            _temp["m_version"],
-            _,
-            _temp["host"],
-            _,
-            _temp["os"],
-        ) = group2.strip().split(" ")
-
-        # Keeps the order of insertion for printing
-        results["branch"] = _temp["branch"]
-        results["host"] = _temp["host"]
-        results["compiler"] = _temp["compiler"]
-        results["c_version"] = _temp["c_version"]
-        results["mpi"] = _temp["mpi"]
-        results["m_version"] = _temp["m_version"].lower()
-        results["o_g"] = _temp["o_g"]
-        results["os"] = _temp["os"]
+# Build for = gfortran_10.3.0_mpich3_g_develop, mpi version 8.1.7 on acorn esmf_os: Linux
+# -> compiler, c_version, mpi, o_g, branch and the seven space separated words
+# after the first comma, the branch being everything after the fourth "_"
+_BUILD_LINE_PATTERN = re.compile(
+    r"[^=]*=\s*([^_,]*)_([^_,]*)_([^_,]*)_([^_,]*)_([^,]*?)\s*,"
+    r"\s*(?=\S)([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*) ([^ ]*\S)\s*\Z"
+)
 
-        return results
 
-    except ValueError:
-        logging.error("group1: %s", group1)
-        logging.error("group2: %s", group2)
-        logging.error("could not split %s on ", line_cleaned)
-        raise
+def extract_build_attributes(line: str) -> Dict[str, Any]:
+    """extracs build atrributes when found in file_path"""
+    found = _BUILD_LINE_PATTERN.match(line)
+    if found is None:
+        logging.error("could not split %s on ", line)
+        raise ValueError(f"unrecognized build line: {line!r}")
+    (
+        compiler,
+        c_version,
+        mpi,
+        o_g,
+        branch,
+        _,
+        _,
+        m_version,
+        _,
+        host,
+        _,
+        _os,
+    ) = found.groups()
+
+    # dicts keep the order of insertion for printing
+    return {
+        "branch": branch,
+        "host": host,
+        "compiler": compiler,
+        "c_version": c_version,
+        "mpi": mpi,
+        "m_version": m_version.lower(),
+        "o_g": o_g,
+        "os": _os,
+    }
 
 
 class Build(ReadOnly):
@@ -208,5 +202,6 @@ class Build(ReadOnly):
 
 def fetch_job_attributes(_path: pathlib.Path):
     """returns job attributes based on position in path"""
-    result = os.path.normpath(_path).split(os.sep)
+    # only the last nine components are used
+    result = os.path.normpath(_path).rsplit(os.sep, 9)
     return [result[x].lower().replace("out", "") for x in range(-9, -2, 1)]
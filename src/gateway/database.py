@@ -6,11 +6,13 @@ Database interaction layer
 author: Ryan Long <ryan.long@noaa.gov>
 """
 
+import contextlib
+import operator
 import pathlib
 import sqlite3
 import collections
 import time
-from typing import Any, Dict, Generator, List
+from typing import Any, Dict, Generator, List, Optional, Tuple
 import abc
 
 
@@ -22,6 +24,11 @@ SummaryRowData = collections.namedtuple(
     "branch, host, compiler, c_version, mpi, m_version, o_g, os, unit_pass, unit_fail, system_pass, system_fail, example_pass, example_fail, nuopc_pass, nuopc_fail, build_passed, netcdf_c, netcdf_f, artifacts_hash, branch_hash, modified",
 )
 
+FETCH_BATCH_SIZE = 1000
+
+# pulls a row dict's values out in column order as a plain tuple
+_summary_row_values = operator.itemgetter(*SummaryRowData._fields)
+
 
 class Database(abc.ABC):
     """Database abstract"""
@@ -41,52 +48,122 @@ class Database(abc.ABC):
         """fetchs rows by hash"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def close(self):
+        """persists pending writes and closes the database"""
+        raise NotImplementedError
+
 
 class Archive(Database):
     """persists data to a sqlite3 database"""
 
+    _INSERT_SQL = "INSERT OR REPLACE INTO summaries VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+    _SELECT_COLUMNS_SQL = """SELECT branch, host, compiler, c_version, mpi, m_version, o_g, os, build, u_pass, u_fail, s_pass, s_fail, e_pass, e_fail, nuopc_pass, nuopc_fail, netcdf_c, netcdf_f, artifacts_hash, modified FROM Summaries"""
+    _ORDER_BY_SQL = (
+        """ORDER BY branch, host, compiler, c_version, mpi, m_version, o_g"""
+    )
+    _SELECT_BY_HASH_SQL = f"{_SELECT_COLUMNS_SQL} WHERE branch_hash = ? {_ORDER_BY_SQL}"
+    _SELECT_ALL_SQL = f"{_SELECT_COLUMNS_SQL} {_ORDER_BY_SQL}"
+    _SELECT_SNAPSHOT_SQL = (
+        """SELECT artifacts_head, qty, version FROM Snapshots WHERE machine = ? AND branch = ?"""
+    )
+    _UPDATE_SNAPSHOT_SQL = "INSERT OR REPLACE INTO Snapshots VALUES(?,?,?,?,?)"
+    _CREATE_SQL = """
+        CREATE TABLE if not exists Summaries (branch, host, compiler, c_version, mpi, m_version, o_g, os, u_pass, u_fail, s_pass, s_fail, e_pass, e_fail, nuopc_pass, nuopc_fail, build, netcdf_c, netcdf_f, artifacts_hash, branch_hash, modified DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (branch, host, compiler, compiler, c_version, mpi, m_version, o_g, os));
+        -- covers WHERE branch_hash = ? and its ORDER BY, so no sort step is needed
+        CREATE INDEX if not exists summary_branch_hash_order_idx ON Summaries (branch_hash, branch, host, compiler, c_version, mpi, m_version, o_g);
+        DROP INDEX if exists summary_branch_hash_idx;
+        -- artifacts commit and tool version each machine/branch was last summarized at
+        CREATE TABLE if not exists Snapshots (machine, branch, artifacts_head, qty, version, PRIMARY KEY (machine, branch));
+    """
+
     def __init__(self, db_path: pathlib.Path):
-        self.con = sqlite3.connect(str(db_path))
         self.db_path = db_path
+        # autocommit mode, transactions are opened explicitly by transaction
+        self.con = sqlite3.connect(str(db_path), isolation_level=None)
+        self._transaction_depth = 0
+        # commits reach db_path right away, fsyncs wait for WAL checkpoints
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.execute("PRAGMA temp_store=MEMORY")
+        # negative values are KiB, i.e. a 64 MiB page cache
+        self.con.execute("PRAGMA cache_size=-65536")
+        self.create_table()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """wraps the block in BEGIN IMMEDIATE/COMMIT, rolling back on error
+
+        Nested blocks join the outermost transaction.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+        self.con.execute("BEGIN IMMEDIATE")
+        self._transaction_depth = 1
+        try:
+            yield
+        except BaseException:
+            self.con.execute("ROLLBACK")
+            raise
+        else:
+            self.con.execute("COMMIT")
+        finally:
+            self._transaction_depth = 0
 
     def create_table(self):
-        cur = self.con.cursor()
-        cur.execute(
-            """CREATE TABLE if not exists Summaries (branch, host, compiler, c_version, mpi, m_version, o_g, os, u_pass, u_fail, s_pass, s_fail, e_pass, e_fail, nuopc_pass, nuopc_fail, build, netcdf_c, netcdf_f, artifacts_hash, branch_hash, modified DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (branch, host, compiler, compiler, c_version, mpi, m_version, o_g, os))"""
-        )
-        cur.execute(
-            """CREATE INDEX if not exists summary_branch_hash_idx ON Summaries (branch_hash)"""
-        )
-        self.con.commit()
+        # one script, one parse and one commit
+        self.con.executescript(self._CREATE_SQL)
 
     def insert_rows(self, data: List[Dict[str, Any]]) -> int:
-        self.create_table()
-
-        rows = list(SummaryRowData(**row) for row in data)
-        cur = self.con.cursor()
-        cur.executemany(
-            "INSERT OR REPLACE INTO summaries VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-            rows,
-        )
-        self.con.commit()
+        rows = [_summary_row_values(row) for row in data]
+        # one transaction for the whole batch
+        with self.transaction():
+            cur = self.con.executemany(self._INSERT_SQL, rows)
         return cur.rowcount
 
+    def fetch_snapshot(
+        self, machine_name: str, branch_name: str
+    ) -> Optional[Tuple[str, int, int]]:
+        """returns the (artifacts_head, qty, version) the branch was last
+        summarized at"""
+        cur = self.con.execute(self._SELECT_SNAPSHOT_SQL, (machine_name, branch_name))
+        return cur.fetchone()
+
+    def update_snapshot(
+        self,
+        machine_name: str,
+        branch_name: str,
+        artifacts_head: str,
+        qty: int,
+        version: int,
+    ) -> None:
+        """records that the branch has been summarized at artifacts_head"""
+        with self.transaction():
+            self.con.execute(
+                self._UPDATE_SNAPSHOT_SQL,
+                (machine_name, branch_name, artifacts_head, qty, version),
+            )
+
+    def close(self):
+        # closing the last connection checkpoints the WAL into db_path
+        self.con.close()
+
     def fetch_rows_by_hash(self, _hash: str):
         cur = self.con.cursor()
-        cur.execute(
-            """SELECT branch, host, compiler, c_version, mpi, m_version, o_g, os, build, u_pass, u_fail, s_pass, s_fail, e_pass, e_fail, nuopc_pass, nuopc_fail, netcdf_c, netcdf_f, artifacts_hash, modified FROM Summaries WHERE branch_hash = ? ORDER BY branch, host, compiler, c_version, mpi, m_version, o_g""",
-            (str(_hash),),
-        )
-        columns = list(x[0] for x in cur.description)
-        return (SummaryRow(dict(zip(columns, values))) for values in cur.fetchall())
+        cur.arraysize = FETCH_BATCH_SIZE
+        cur.execute(self._SELECT_BY_HASH_SQL, (str(_hash),))
+        return stream_rows(cur)
 
     def fetch_rows_by_branch(self):
         cur = self.con.cursor()
-        cur.execute(
-            """SELECT branch, host, compiler, c_version, mpi, m_version, o_g, os, build, u_pass, u_fail, s_pass, s_fail, e_pass, e_fail, nuopc_pass, nuopc_fail, netcdf_c, netcdf_f, artifacts_hash, modified FROM Summaries ORDER BY branch, host, compiler, c_version, mpi, m_version, o_g"""
-        )
-        columns = list(x[0] for x in cur.description)
-        return (SummaryRow(dict(zip(columns, values))) for values in cur.fetchall())
+        cur.arraysize = FETCH_BATCH_SIZE
+        cur.execute(self._SELECT_ALL_SQL)
+        return stream_rows(cur)
 
     def fetch_all_branch_hashes_by_branch_name(self, branch_name):
         cur = self.con.cursor()
@@ -97,6 +174,17 @@ class Archive(Database):
         return cur.fetchall()
 
 
+def stream_rows(cur: sqlite3.Cursor) -> Generator[SummaryRow, None, None]:
+    """yields the rows of an executed cursor, fetching cur.arraysize at a time"""
+    columns = list(x[0] for x in cur.description)
+    while True:
+        batch = cur.fetchmany()
+        if not batch:
+            return
+        for values in batch:
+            yield SummaryRow(dict(zip(columns, values)))
+
+
 def to_summary_row(item: Dict[str, Any]):
     """converts dict to SummaryRow"""
     return SummaryRowData(**item)
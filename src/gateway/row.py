@@ -71,32 +71,43 @@ class SummaryRow:
 
     def formatted(self):
         """returns formatted dict on summary output from database"""
+        row = self.row
         # replace queued value with "pending"
         parsed_row = {
             k: "pending" if v == constants.QUEUED else v
             for k, v in self.ordered().items()
-            if k in self.OUTPUT_ORDER
         }
         # replace 1/0 with pass/fail
-        parsed_row["build"] = "pass" if self.build == constants.PASS else "fail"
+        parsed_row["build"] = "pass" if row["build"] == constants.PASS else "fail"
 
         # format item and versions into one row
-        parsed_row["compiler"] = f"{self.compiler} {self.c_version}"
-        parsed_row["mpi"] = f"{self.mpi} {self.m_version}"
+        parsed_row["compiler"] = f"{row['compiler']} {row['c_version']}"
+        parsed_row["mpi"] = f"{row['mpi']} {row['m_version']}"
 
         # concat netcdf versions
-        parsed_row["netcdf"] = f"{self.netcdf_c} {self.netcdf_f}"
+        parsed_row["netcdf"] = f"{row['netcdf_c']} {row['netcdf_f']}"
 
         # generate link for github
         parsed_row["artifacts_hash"] = file.generate_link(
-            hash=self.artifacts_hash, path=self.relative_path
+            hash=row["artifacts_hash"], path=self.relative_path
         )
         return parsed_row
 
     @property
     def relative_path(self):
         """git relative path for hyperlinks"""
-        return f"{self.branch}/{self.host}/{self.compiler}/{self.c_version}/{self.o_g}/{self.mpi}/{self.m_version}"
+        row = self.row
+        return "/".join(
+            (
+                row["branch"],
+                row["host"],
+                row["compiler"],
+                row["c_version"],
+                row["o_g"],
+                row["mpi"],
+                row["m_version"],
+            )
+        )
 
     def ordered(self):
         """returns dict ordered by self.KEY_ORDER"""
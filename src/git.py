@@ -12,8 +12,10 @@ import os
 
 import subprocess
 import pathlib
+import re
+import tempfile
 import time
-from typing import Any, List, Union
+from typing import Any, Dict, Generator, List, Optional, Union
 
 
 LOG_FORMAT_HASH = "--format=%H"
@@ -24,15 +26,19 @@ class Git:
 
     WARNINGS = ["not something we can merge"]
     RETRIES = ["index.lock"]
+    _WARNING_RE = re.compile("|".join(map(re.escape, WARNINGS)))
+    _RETRY_RE = re.compile("|".join(map(re.escape, RETRIES)))
 
     def __init__(self, repopath: pathlib.Path):
         self.repopath = repopath
+        self._remote_branches: Optional[List[str]] = None
+        self._ls_remote_refs: Dict[str, Dict[str, str]] = {}
 
     def _command_safe(
-        self, cmd: Union[str, List[str]], cwd=None
+        self, cmd: Union[str, List[str]], cwd=None, text: bool = True
     ) -> subprocess.CompletedProcess:
         """_command_safe ensures commands are run safely and raise exceptions
-        on error
+        on error, text=False leaves stdout as undecoded bytes
 
         https://stackoverflow.com/questions/4917871/does-git-return-specific-return-error-codes
         """
@@ -46,59 +52,86 @@ class Git:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 check=True,
-                encoding="utf-8",
+                encoding="utf-8" if text else None,
             )
         except subprocess.CalledProcessError as error:
             logging.info(error.stdout)
-            if error.stderr:
-                if any(
-                    (warning for warning in self.WARNINGS if warning in error.stderr)
-                ):
-                    logging.warning(error.stderr)
-                if any(retry for retry in self.RETRIES if retry in error.stderr):
+            stderr = error.stderr
+            if stderr and not text:
+                stderr = stderr.decode("utf-8", "replace")
+            if stderr:
+                if self._WARNING_RE.search(stderr):
+                    logging.warning(stderr)
+                if self._RETRY_RE.search(stderr):
                     logging.warning("The repository is being used by another process, retrying in 60 seconds.")
                     time.sleep(60)
-                    self._command_safe(cmd, cwd)
-                else:
-                    raise GitError(error.stderr) from error
+                    return self._command_safe(cmd, cwd, text)
+                raise GitError(stderr) from error
             return subprocess.CompletedProcess(
                 returncode=0, args="", stdout=error.stdout
             )
 
+    def _command_stream(
+        self, cmd: Union[str, List[str]], cwd=None
+    ) -> Generator[str, None, None]:
+        """like _command_safe, but yields stdout line by line (without the
+        newline) while the command is still running"""
+        cwd = self.repopath if cwd is None else cwd
+        # stderr goes to a file, a full stderr pipe nobody reads would block
+        # the command before stdout ends
+        with tempfile.TemporaryFile() as stderr, subprocess.Popen(
+            list(cmd), cwd=cwd, stdout=subprocess.PIPE, stderr=stderr
+        ) as proc:
+            try:
+                for line in proc.stdout:
+                    yield (line[:-1] if line.endswith(b"\n") else line).decode("utf-8")
+            except GeneratorExit:
+                # the caller stopped early, don't wait for the rest
+                proc.kill()
+                raise
+            if proc.wait() != 0:
+                stderr.seek(0)
+                raise GitError(stderr.read().decode("utf-8", "replace"))
+
     def reset_branch(self) -> subprocess.CompletedProcess:
         """git checkout ."""
         return self._command_safe(["git", "checkout", "."], self.repopath)
 
     def list_all_branches(self, url=None) -> List[str]:
         """
-        git branch -r
+        git for-each-ref refs/remotes/
         git ls-remote --heads --refs <url>
         """
         if url is None:
-            return [
-                item.strip()
-                for item in self._command_safe(
-                    ["git", "branch", "-r"], self.repopath
-                ).stdout.split("\n")[1:-1]
-            ]
-        return [
-            item
+            if self._remote_branches is None:
+                self._remote_branches = [
+                    item[len("refs/remotes/") :]
+                    for item in self._command_safe(
+                        ["git", "for-each-ref", "--format=%(refname)", "refs/remotes/"],
+                        self.repopath,
+                    ).stdout.split("\n")
+                    if item and not item.endswith("/HEAD")
+                ]
+            return list(self._remote_branches)
+        return [f"{sha}\t{ref}" for ref, sha in self._ls_remote(url).items()]
+
+    def _ls_remote(self, url) -> Dict[str, str]:
+        """git ls-remote --heads --refs <url> as {ref: sha}, run once per url"""
+        if url not in self._ls_remote_refs:
+            refs = {}
             for item in self._command_safe(
                 ["git", "ls-remote", "--heads", "--refs", url],
                 self.repopath,
-            ).stdout.split("\n")
-        ]
+                text=False,
+            ).stdout.splitlines():
+                sha, _, ref = item.decode("utf-8").partition("\t")
+                refs[ref] = sha
+            self._ls_remote_refs[url] = refs
+        return self._ls_remote_refs[url]
 
     def snapshot(self, url) -> List[Any]:
         """Returns a list of most recent hashes per branch"""
-        return [
-            item.split("\t")[1].replace("refs/heads/", "")
-            for item in self._command_safe(
-                ["git", "ls-remote", "--heads", "--refs", url],
-                self.repopath,
-            ).stdout.split("\n")
-            if len(item) > 0
-        ]
+        return [ref.partition("refs/heads/")[2] for ref in self._ls_remote(url)]
 
     def show(self, branch, path_spec) -> subprocess.CompletedProcess:
         """git show <branch>:<path_spec>"""
@@ -111,9 +144,17 @@ class Git:
             self.repopath,
         )
 
-    def fetch(self) -> subprocess.CompletedProcess:
-        """git fetch"""
-        return self._command_safe(["git", "fetch"], self.repopath)
+    def fetch(self, destination=None, *refs) -> subprocess.CompletedProcess:
+        """
+        git fetch
+        git fetch <destination> <refs>...
+        """
+        self._remote_branches = None
+        cmd = ["git", "fetch"]
+        if destination:
+            cmd.append(destination)
+            cmd.extend(refs)
+        return self._command_safe(cmd, self.repopath)
 
     def add(self, _file_path=None, force=False) -> subprocess.CompletedProcess:
         """
@@ -166,6 +207,7 @@ class Git:
         git pull <destination> <branch>
         """
 
+        self._remote_branches = None
         cmd = ["git", "pull", destination]
         if branch:
             cmd.append(branch)
@@ -199,6 +241,25 @@ class Git:
         """git rebase origin/<branch_name>"""
         return self._command_safe(["git", "rebase", f"origin/{branch_name}"])
 
+    def worktree_add(
+        self, _path: pathlib.Path, commitish: str
+    ) -> subprocess.CompletedProcess:
+        """git worktree add --force --detach <_path> <commitish>"""
+        return self._command_safe(
+            ["git", "worktree", "add", "--force", "--detach", str(_path), commitish],
+            self.repopath,
+        )
+
+    def worktree_prune(self) -> subprocess.CompletedProcess:
+        """git worktree prune"""
+        return self._command_safe(["git", "worktree", "prune"], self.repopath)
+
+    def rev_parse(self, ref: str) -> str:
+        """git rev-parse <ref>"""
+        return self._command_safe(
+            ["git", "rev-parse", ref], self.repopath
+        ).stdout.strip()
+
     def log(self, *args) -> subprocess.CompletedProcess:
         """git log <*args>"""
         cmd = ["git", "log"]
@@ -207,6 +268,10 @@ class Git:
                 cmd.append(arg)
         return self._command_safe(cmd, self.repopath)
 
+    def log_lines(self, *args) -> Generator[str, None, None]:
+        """git log <*args>, streamed line by line"""
+        return self._command_stream(["git", "log", *args], self.repopath)
+
 
 def from_shallow_clone(url, _path: pathlib.Path) -> "Git":
     """creates a Git instance from a url"""
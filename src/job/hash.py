@@ -8,13 +8,14 @@ author: Ryan Long <ryan.long@noaa.gov>
 
 import collections
 import re
-from typing import List
+from typing import List, Pattern
 
 
 class Hash(collections.UserString):
     """contains methods to parse and represent a job hash"""
 
     PARSE_PATTERNS: List[str] = [r"ESMF_\S*", r"v\S*\.\S*\.\S*"]
+    _PARSE_RES: List[Pattern[str]] = [re.compile(x) for x in PARSE_PATTERNS]
 
     def __init__(self, value: str):
         super().__init__(self._parse(value))
@@ -23,11 +24,10 @@ class Hash(collections.UserString):
         return str(self.data)
 
     def _parse(self, value) -> str:
-        for pattern in self.PARSE_PATTERNS:
-            try:
-                return re.findall(pattern, value)[0]
-            except IndexError:
-                continue
+        for pattern in self._PARSE_RES:
+            found = pattern.search(value)
+            if found is not None:
+                return found.group(0)
         return ""
 
     def patterns(self) -> List[str]:
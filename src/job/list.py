@@ -19,6 +19,11 @@ class UniqueList(collections.UserList):
 
 def _to_unique(items: Iterable) -> List[Any]:
     """Returns a list with only unique values, regardles if hashable"""
+    items = list(items)
+    try:
+        return list(dict.fromkeys(items))
+    except TypeError:
+        pass
     result = []
     for item in items:
         if item not in result:
@@ -3,8 +3,9 @@ Processeses job requests into summary results.
 
 author: Ryan Long <ryan.long@noaa.gov>
 """
-import bisect
 import collections
+import concurrent.futures
+import contextlib
 import csv
 import functools
 import itertools
@@ -13,9 +14,23 @@ import os
 import pathlib
 import re
 import shutil
-from typing import Any, Dict, Generator, List, Sequence, Tuple, Union
-
-from tabulate import tabulate
+import subprocess
+import tempfile
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 from src import constants, file
 from src.compass import Compass
@@ -25,11 +40,34 @@ from src.job.hash import Hash
 from src.job.list import UniqueList
 
 
-def _replace(old: str, new: str, target: str):
-    return target.replace(old, new)
+@functools.lru_cache(maxsize=None)
+def sanitize_branch_name(branch_name: str) -> str:
+    """returns branch_name usable as a single path component"""
+    return branch_name.replace("/", "_")
+
+
+# patterns that read the same as a POSIX ERE and a python regex
+_ERE_SAFE_PATTERN = re.compile(r"[\w.-]+")
+
+_LOG_LINE_BRANCH_PATTERN = re.compile(r"(_[Og]_)(.*)(\swith.*)")
+
+# unit test results   \tPASS 8926\tFAIL 0 -> unit, 8926, 0; anything else is
+# left to the split based parsing in fetch_test_results
+_TEST_RESULTS_PATTERN = re.compile(
+    r"[^\S\t]*(\S+)[^\t]*\t[ \t]*PASS[ \t]+(\d+)[ \t]+FAIL[ \t]+(\d+)\s*\Z"
+)
+
+# files handed to a single grep invocation
+GREP_BATCH_SIZE = 1000
+
+# hashes of one job summarized concurrently
+MAX_HASH_THREADS = 8
 
+# directories never holding artifacts, pruned from the walk
+PRUNED_DIR_NAMES = frozenset([".git"])
 
-sanitize_branch_name = functools.partial(_replace, "/", "_")
+# build logs or summary files handed to a scan worker process at a time
+SCAN_CHUNK_SIZE = 16
 
 
 TestResult = collections.namedtuple(
@@ -60,6 +98,8 @@ TestResult = collections.namedtuple(
     ],
 )
 
+TEST_RESULT_KINDS = ("unit", "system", "example", "nuopc")
+
 JobRequest = collections.namedtuple(
     "JobRequest", ["machine_name", "branch_name", "qty"]
 )
@@ -97,12 +137,17 @@ class Processor:
         branches: List[str],
         history_increments: int,
         _gateway,
+        workers: Optional[int] = None,
     ):
 
         self.machines = machines
         self._branches = branches
         self.history_increments = history_increments
         self.gateway = _gateway
+        self.workers = min(len(machines), workers or os.cpu_count() or 1)
+        self.scan_executor: Optional[concurrent.futures.Executor] = None
+        self._branch_logs: Dict[Tuple[str, str], List[str]] = {}
+        self._checked_out: Optional[str] = None
 
     def __iter__(self):
         return (x for x in self.jobs)
@@ -114,23 +159,33 @@ class Processor:
     def extract_branch_names_from_git_log(self):
         """extracts branch names from git log"""
         if not self._branches:
-            self.gateway.git_artifacts.fetch()
+            self.fetch_artifacts()
             self._branches = list(
                 {
-                    extract_branch_from_log_line(item)
-                    for item in self.gateway.git_artifacts.log("--all").stdout.split(
-                        "\n"
+                    branch_name
+                    for branch_name in map(
+                        extract_branch_from_log_line,
+                        self.gateway.git_artifacts.log_lines("--all"),
                     )
-                    if extract_branch_from_log_line(item) != ""
+                    if branch_name != ""
                 }
             )
         return self._branches
 
+    def fetch_artifacts(self):
+        """fetches only the artifact branches of the instance machines,
+        falling back to a full fetch if one of them is not on the remote"""
+        try:
+            self.gateway.git_artifacts.fetch("origin", *self.machines)
+        except GitError:
+            logging.debug("failed to fetch machine branches. fetching all...")
+            self.gateway.git_artifacts.fetch()
+
     @property
     def branches(self):
         """return branches to be summarized"""
         if not self._branches:
-            self.gateway.git_artifacts.fetch()
+            self.fetch_artifacts()
             try:
                 self._branches = self.gateway.git_artifacts.snapshot(self.REPO_URL)
             except GitError:
@@ -154,38 +209,149 @@ class Processor:
             _root,
             sanitize_branch_name(job.branch_name),
         )
-        if force and not os.path.exists(branch_path):
-            logging.debug("creating directory %s", branch_path)
-            os.makedirs(branch_path)
+        if force:
+            os.makedirs(branch_path, exist_ok=True)
         return branch_path
 
     def copy_files_to_repo_path(self, files: List[str]) -> None:
         """copies local files to repopath"""
 
         for _file in files:
-            shutil.copyfile(
+            link_or_copy(
                 os.path.join(self.gateway.compass.root, _file),
                 os.path.join(self.gateway.git_summaries.repopath, _file),
             )
 
     def run_jobs(self) -> None:
-        """runs the instance jobs"""
-        for job in self.jobs:
-            self.generate_summaries(job)
-            logging.info(
-                "finished summaries for branch %s on machine %s",
-                job.branch_name,
-                job.machine_name,
-            )
+        """runs the instance jobs, pushing every summary commit once at the end"""
+        try:
+            if self.workers > 1:
+                self.run_jobs_in_worktrees()
+            else:
+                # worktree workers already occupy the cores; only the serial
+                # path spreads the build log scans over processes
+                with concurrent.futures.ProcessPoolExecutor() as executor:
+                    # the first submit forks every worker; do it before the
+                    # per-hash threads exist so no child inherits their locks
+                    executor.submit(int).result()
+                    self.scan_executor = executor
+                    for job in self.jobs:
+                        self.generate_summaries(job)
+                        logging.info(
+                            "finished summaries for branch %s on machine %s",
+                            job.branch_name,
+                            job.machine_name,
+                        )
+                self.scan_executor = None
+        finally:
+            # also on errors and SIGINT's sys.exit
+            self.gateway.archive.close()
         logging.debug("pushing to summary")
         self.copy_files_to_repo_path(["esmf-branch-summary.log", "summaries.db"])
         self.gateway.git_summaries.add()
         self.gateway.git_summaries.commit("updating test artifacts")
         self.gateway.git_summaries.push("origin")
 
+    def run_jobs_in_worktrees(self) -> None:
+        """collects each machine's summaries in its own worker process and
+        worktree, then writes them to the archive and summary repo serially"""
+        worktree_root = os.path.join(
+            os.path.abspath(tempfile.gettempdir()),
+            constants.DEFAULT_WORKTREE_SPACE_NAME,
+        )
+        branches = list(self.branches)
+        heads = {
+            machine_name: self.fetch_artifacts_head(machine_name)
+            for machine_name in self.machines
+        }
+        pending = {
+            machine_name: [
+                branch_name
+                for branch_name in branches
+                if not self.is_up_to_date(
+                    JobRequest(machine_name, branch_name, self.history_increments),
+                    heads[machine_name],
+                )
+            ]
+            for machine_name in self.machines
+        }
+        logging.info("collecting summaries with %i workers", self.workers)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers
+        ) as executor:
+            futures = [
+                executor.submit(
+                    collect_machine_summaries,
+                    machine_name,
+                    pending[machine_name],
+                    self.history_increments,
+                    self.gateway.compass,
+                    worktree_root,
+                )
+                for machine_name in self.machines
+                if pending[machine_name]
+            ]
+            for future in futures:
+                for job, summaries in future.result():
+                    self.record_summaries(job, summaries, heads[job.machine_name])
+                    logging.info(
+                        "finished summaries for branch %s on machine %s",
+                        job.branch_name,
+                        job.machine_name,
+                    )
+
+    def fetch_artifacts_head(self, machine_name: str) -> str:
+        """returns the artifacts commit the machine's summaries are built from"""
+        return self.gateway.git_artifacts.rev_parse(f"origin/{machine_name}")
+
+    def fetch_branch_log(self, machine_name: str) -> List[str]:
+        """returns the commit message lines of the machine's artifacts that
+        mention it, cached per artifacts commit so every branch on a machine
+        shares one git log"""
+        artifacts_head = self.fetch_artifacts_head(machine_name)
+        key = (machine_name, artifacts_head)
+        if key not in self._branch_logs:
+            greps = (
+                [f"--grep={machine_name}"]
+                if _ERE_SAFE_PATTERN.fullmatch(machine_name)
+                else []
+            )
+            lines = self.gateway.git_artifacts.log_lines(
+                "--format=%B", "--extended-regexp", *greps, artifacts_head
+            )
+            # streamed, split on bare carriage returns like a text mode read,
+            # keeping only the lines get_branch_hashes can use
+            self._branch_logs[key] = [
+                part
+                for line in lines
+                for part in line.rstrip("\r").split("\r")
+                if machine_name in part
+            ]
+        return self._branch_logs[key]
+
+    def is_up_to_date(self, job: JobRequest, artifacts_head: str) -> bool:
+        """True if job was already summarized from artifacts_head by this
+        version"""
+        snapshot = self.gateway.archive.fetch_snapshot(
+            job.machine_name, job.branch_name
+        )
+        if snapshot is not None and tuple(snapshot) == (
+            artifacts_head,
+            job.qty,
+            constants.SNAPSHOT_VERSION,
+        ):
+            logging.info(
+                "skipping %s [%s], artifacts unchanged since %s",
+                job.branch_name,
+                job.machine_name,
+                artifacts_head,
+            )
+            return True
+        return False
+
     def get_recent_branch_hashes(self, job: JobRequest) -> Generator[Hash, None, None]:
         """Returns the most recent branch on machine_name + branch_name"""
-        hashes = get_branch_hashes(job, self.gateway.git_artifacts)
+        hashes = get_branch_hashes(job, self.fetch_branch_log(job.machine_name))
         for idx, _hash in enumerate(hashes):
             yield _hash
             if idx + 1 >= job.qty:
@@ -194,15 +360,21 @@ class Processor:
     def write_archive(self, data: List[Any], _hash: Hash) -> None:
         """writes the provided data to the archive"""
         logging.debug("writing archive %s length %i", _hash, len(data))
-        result = self.gateway.archive.insert_rows([item for item in data])
+        result = self.gateway.archive.insert_rows(data)
         logging.info("processed [%i] rows", result)
 
-    def generate_summary(self, _hash: Hash, job: JobRequest) -> List[Any]:
-        """generates summary based on _hash and job and returns the results"""
+    def generate_summary(
+        self,
+        _hash: Hash,
+        job: JobRequest,
+        _candidates: Optional[List[List[str]]] = None,
+    ) -> List[Any]:
+        """generates summary based on _hash and job and returns the results,
+        _candidates are the job's cached filter_files_by_rules results"""
         logging.debug("generating summary for [%s]", _hash)
 
-        matching_logs = get_matching_logs(
-            self.gateway.compass.repopath, str(_hash), job
+        matching_logs, matching_summaries = get_matching_logs_and_summaries(
+            self.gateway.compass.repopath, str(_hash), job, _candidates
         )
         logging.debug("matching logs: %i", len(matching_logs))
         if matching_logs == 0:
@@ -211,9 +383,6 @@ class Processor:
                 _hash,
             )
 
-        matching_summaries = get_matching_summaries(
-            self.gateway.compass.repopath, str(_hash), job
-        )
         logging.debug("matching summaries: %i", len(matching_summaries))
         if matching_summaries == 0:
             logging.warning(
@@ -221,7 +390,9 @@ class Processor:
                 _hash,
             )
 
-        build_passing_results = extract_build_passing_results(matching_logs)
+        build_passing_results = extract_build_passing_results(
+            matching_logs, self.scan_executor
+        )
         logging.debug("finished reading logs")
 
         result = self.compile_test_results(
@@ -235,10 +406,16 @@ class Processor:
         summary: List[TestResult],
         _hash: Hash,
         is_latest: bool = False,
+        branch_path: Optional[str] = None,
     ) -> None:
-        """sends the summary based on the job information to the remote repository"""
-        logging.debug("checking out summary")
-        branch_path = self.branch_path(job, self.gateway.git_summaries.repopath, True)
+        """writes the summary based on the job information to the summary repository
+
+        branch_path, when given, is the job's already created summary directory
+        """
+        if branch_path is None:
+            branch_path = self.branch_path(
+                job, self.gateway.git_summaries.repopath, True
+            )
         output_file_path_prefix = os.path.abspath(os.path.join(branch_path, str(_hash)))
 
         self.write_archive(summary, _hash)
@@ -253,22 +430,98 @@ class Processor:
         #     )
         #     self.write_files(_hash, output_file_path_prefix, is_latest)
 
+        logging.info(
+            "finished summary for B:%s M: %s [%s]",
+            job.branch_name,
+            job.machine_name,
+            _hash,
+        )
+
+    def publish_summaries(self, job: JobRequest, hashes: List[Hash]) -> None:
+        """adds and commits every summary written for job at once"""
+        if not hashes:
+            return
         logging.debug("adding all modified files in summary")
         self.gateway.git_summaries.add()
 
         logging.debug("committing to summary")
         self.gateway.git_summaries.commit(
-            generate_commit_message(job.branch_name, _hash)
+            generate_commit_message(job.branch_name, hashes)
         )
 
-        self.gateway.git_summaries.push()
-
-        logging.info(
-            "finished summary for B:%s M: %s [%s]",
-            job.branch_name,
-            job.machine_name,
-            _hash,
+    def collect_summaries(
+        self, job: JobRequest
+    ) -> List[Tuple[int, Hash, List[Dict[str, Any]]]]:
+        """generates the summary of each recent hash of job from the artifacts"""
+        hashes = list(self.get_recent_branch_hashes(job))
+        if not hashes:
+            return []
+        # the checked out tree and the file name rules are the same for
+        # every hash, walk and filter it once
+        candidates = filter_files_by_rules(
+            walk_artifacts(self.gateway.compass.repopath), matching_rules(job)
         )
+        # generate_summary only reads files and runs read-only git commands,
+        # so hashes can overlap their I/O; writing stays serial
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(MAX_HASH_THREADS, len(hashes))
+        ) as executor:
+            summaries = list(
+                executor.map(
+                    lambda _hash: self.generate_summary(_hash, job, candidates),
+                    hashes,
+                )
+            )
+        results = []
+        for idx, (_hash, summary) in enumerate(zip(hashes, summaries)):
+            logging.info("processing hash [%s: %s]", idx, _hash)
+            if len(summary) > 0:
+                results.append((idx, _hash, summary))
+            else:
+                logging.info(
+                    "missing summary data for %s, %s [%s]",
+                    _hash,
+                    job.branch_name,
+                    job.machine_name,
+                )
+        return results
+
+    def write_summaries(
+        self, job: JobRequest, summaries: List[Tuple[int, Hash, List[Dict[str, Any]]]]
+    ) -> None:
+        """writes and commits the collected summaries for job"""
+        if not summaries:
+            return
+        # the same directory for every hash, created once
+        branch_path = self.branch_path(job, self.gateway.git_summaries.repopath, True)
+        for idx, _hash, summary in summaries:
+            self.send_summary_to_repo(job, summary, _hash, idx == 0, branch_path)
+        self.publish_summaries(job, [_hash for _, _hash, _ in summaries])
+
+    def record_summaries(
+        self,
+        job: JobRequest,
+        summaries: List[Tuple[int, Hash, List[Dict[str, Any]]]],
+        artifacts_head: str,
+    ) -> None:
+        """writes job's summaries and its snapshot in a single archive
+        transaction, committed straight to disk so an interrupted run keeps
+        every finished job
+
+        No snapshot is recorded without summaries, so a job that came up
+        empty, possibly from a transient failure, is retried next run.
+        """
+        if not summaries:
+            return
+        with self.gateway.archive.transaction():
+            self.write_summaries(job, summaries)
+            self.gateway.archive.update_snapshot(
+                job.machine_name,
+                job.branch_name,
+                artifacts_head,
+                job.qty,
+                constants.SNAPSHOT_VERSION,
+            )
 
     def generate_summaries(self, job: JobRequest):
         """generates all the summaries for job"""
@@ -279,27 +532,21 @@ class Processor:
         branch_path = pathlib.Path(
             self.gateway.compass.get_branch_path(sanitize_branch_name(job.branch_name))
         )
-        if not os.path.exists(branch_path):
-            os.mkdir(branch_path)
+        os.makedirs(branch_path, exist_ok=True)
         os.chdir(branch_path)
-        logging.debug("checking out %s", job.machine_name)
-        self.gateway.git_artifacts.checkout(job.machine_name)
+        # jobs arrive grouped by machine, check out and pull each one once
+        if self._checked_out != job.machine_name:
+            logging.debug("checking out %s", job.machine_name)
+            self.gateway.git_artifacts.checkout(job.machine_name)
 
-        logging.debug("pulling from %s", job.machine_name)
-        self.gateway.git_artifacts.pull()
+            logging.debug("pulling from %s", job.machine_name)
+            self.gateway.git_artifacts.pull("origin", job.machine_name)
+            self._checked_out = job.machine_name
 
-        for idx, _hash in enumerate(self.get_recent_branch_hashes(job)):
-            logging.info("processing hash [%s: %s]", idx, _hash)
-            summary = self.generate_summary(_hash, job)
-            if len(summary) > 0:
-                self.send_summary_to_repo(job, summary, _hash, idx == 0)
-            else:
-                logging.info(
-                    "missing summary data for %s, %s [%s]",
-                    _hash,
-                    job.branch_name,
-                    job.machine_name,
-                )
+        artifacts_head = self.fetch_artifacts_head(job.machine_name)
+        if self.is_up_to_date(job, artifacts_head):
+            return
+        self.record_summaries(job, self.collect_summaries(job), artifacts_head)
 
     def _fetch_git_log(self):
         """returns git log for esmf"""
@@ -309,15 +556,8 @@ class Processor:
     def write_files(self, _hash: Hash, file_path: str, is_latest: bool = False):
         """writes all file types required to disk"""
         logging.debug("writing files %s", file_path)
-        summary_file_contents = self.fetch_summary_file_contents(_hash)
-        data: List[Dict[str, Any]] = list(
-            [
-                {
-                    **item,
-                }
-                for item in summary_file_contents
-            ]
-        )
+        # formatted() already builds a fresh dict per row, no copy needed
+        data: List[Dict[str, Any]] = self.fetch_summary_file_contents(_hash)
 
         if not data:
             logging.warning("no new summary data collected")
@@ -327,15 +567,13 @@ class Processor:
         if not os.path.exists(_dir):
             os.makedirs(_dir)
 
-        if is_latest is True:
-            write_file_latest(data, file_path)
-        write_file_md(data, file_path)
+        write_file_md(data, file_path, is_latest is True)
         write_file_csv(data, file_path)
 
     def fetch_file_commit_hash(self, _path: pathlib.Path):
         """returns the last hash for the files commit history"""
         return (
-            self.gateway.git_artifacts.log("--format=%H", "--", str(_path))
+            self.gateway.git_artifacts.log("-n", "1", "--format=%H", "--", str(_path))
             .stdout.split("\n")[0]
             .strip()
         )
@@ -344,7 +582,7 @@ class Processor:
         """returns the last hash for the files commit history"""
         return (
             self.gateway.git_artifacts.log(
-                "--format=%cd", "--date=iso", "--", str(_path)
+                "-n", "1", "--format=%cd", "--date=iso", "--", str(_path)
             )
             .stdout.split("\n")[0]
             .strip()
@@ -357,9 +595,16 @@ class Processor:
         _hash: Hash,
     ) -> List[TestResult]:
         """takes all of the gathered data and returns a list of the results"""
+        file_paths = [_file.file_path for _file in matching_summaries]
+        # summary files parse independently, spread them like the build logs
+        if self.scan_executor is None or len(file_paths) <= 1:
+            parsed = map(fetch_test_results, file_paths)
+        else:
+            parsed = self.scan_executor.map(
+                fetch_test_results, file_paths, chunksize=SCAN_CHUNK_SIZE
+            )
         results = []
-        for _file in matching_summaries:
-            test_results = fetch_test_results(_file.file_path)
+        for _file, test_results in zip(matching_summaries, parsed):
             build_results = fetch_build_result(test_results, build_passing_results)
             temp = {**test_results, **build_results._asdict()}
             results.append(
@@ -385,151 +630,341 @@ class Processor:
         )
 
 
-def write_file_md(data: List[Dict[str, str]], file_path: str) -> None:
-    """writes markdown file"""
+def collect_machine_summaries(
+    machine_name: str,
+    branches: List[str],
+    history_increments: int,
+    compass: Compass,
+    worktree_root: str,
+) -> List[Tuple[JobRequest, List[Tuple[int, Hash, List[Dict[str, Any]]]]]]:
+    """collects the summaries of every branch on machine_name
+
+    Runs in a worker process.  The machine is checked out into its own
+    worktree so workers never share a working tree or index.
+    """
+    git_artifacts = Git(compass.repopath)
+    worktree_path = pathlib.Path(os.path.join(worktree_root, machine_name))
+    if os.path.exists(worktree_path):
+        shutil.rmtree(worktree_path)
+    git_artifacts.worktree_prune()
+    logging.debug("creating worktree %s", worktree_path)
+    git_artifacts.worktree_add(worktree_path, f"origin/{machine_name}")
+    try:
+        processor = Processor(
+            [machine_name],
+            branches,
+            history_increments,
+            BranchSummaryGateway(
+                Git(worktree_path), None, None, Compass(compass.root, worktree_path)
+            ),
+            workers=1,
+        )
+        return [(job, processor.collect_summaries(job)) for job in processor.jobs]
+    finally:
+        shutil.rmtree(worktree_path)
+        git_artifacts.worktree_prune()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """hard links src to dst, replacing dst, falling back to a copy when
+    they are on different filesystems or links are not supported"""
+    if os.path.exists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def write_markdown_table(data: List[Dict[str, Any]], *files: IO[str]) -> None:
+    """writes data to each of files as a github flavored markdown table, one
+    row at a time, rendering every row only once"""
+    headers = list(data[0].keys())
+    lines = itertools.chain(
+        (
+            "|    | " + " | ".join(headers) + " |\n",
+            "|----|" + "|".join("-" * (len(x) + 2) for x in headers) + "|\n",
+        ),
+        (
+            f"| {idx:>2} | "
+            + " | ".join("" if row[x] is None else str(row[x]) for x in headers)
+            + " |\n"
+            for idx, row in enumerate(data)
+        ),
+    )
+    for line in lines:
+        for _file in files:
+            _file.write(line)
+
+
+def open_output_file(file_path: str) -> IO[str]:
+    """opens file_path for writing a summary file"""
+    return open(
+        file_path,
+        "w+",
+        newline="",
+        encoding=constants.DEFAULT_FILE_ENCODING,
+        buffering=constants.DEFAULT_WRITE_BUFFER_SIZE,
+    )
+
+
+def write_file_md(
+    data: List[Dict[str, str]], file_path: str, is_latest: bool = False
+) -> None:
+    """writes markdown file, and the same table as -latest.md if is_latest"""
     logging.debug("writing file md: %s", file_path)
-    table = tabulate(data, headers="keys", showindex="always", tablefmt="github")
-    with open(
-        file_path + ".md", "w+", newline="", encoding=constants.DEFAULT_FILE_ENCODING
-    ) as _file:
-        _file.write(table)
+    with contextlib.ExitStack() as stack:
+        files = [stack.enter_context(open_output_file(file_path + ".md"))]
+        if is_latest:
+            logging.debug("writing file -latest: %s", file_path)
+            files.append(
+                stack.enter_context(open_output_file(latest_file_path(file_path)))
+            )
+        write_markdown_table(data, *files)
 
 
 def write_file_csv(data: List[Dict[str, str]], file_path: str) -> None:
     """writes csv file"""
     logging.debug("writing file csv[%i]: %s", len(data), file_path)
-    with open(
-        file_path + ".csv", "w+", newline="", encoding=constants.DEFAULT_FILE_ENCODING
-    ) as csv_file:
+    with open_output_file(file_path + ".csv") as csv_file:
         writer = csv.writer(csv_file, delimiter=",", quoting=csv.QUOTE_MINIMAL)
         writer.writerow(data[0].keys())
-        for row in data:
-            writer.writerow(row.values())
+        writer.writerows(row.values() for row in data)
 
 
-def write_file_latest(data: List[Any], file_path: str) -> None:
-    """writes the most recent file as -latest.md"""
-    logging.debug("writing file -latest: %s", file_path)
-    table = tabulate(data, headers="keys", showindex="always", tablefmt="github")
+def latest_file_path(file_path: str) -> str:
+    """returns the path of the -latest.md file next to file_path"""
     last_char_index = file_path.rfind("/")
-    latest_file_path = file_path[:last_char_index] + "/-latest.md"
-    with open(
-        latest_file_path, "w+", newline="", encoding=constants.DEFAULT_FILE_ENCODING
-    ) as _file:
-        _file.write(table)
+    return file_path[:last_char_index] + "/-latest.md"
 
 
-def generate_permutations(
-    list1: List[Any], list2: List[Any]
-) -> Generator[Tuple, None, None]:
+def generate_permutations(list1: List[Any], list2: List[Any]) -> Iterator[Tuple]:
     """retuns list of tuples containing each permutation of the two lists"""
-    return (each_permutation for each_permutation in itertools.product(list1, list2))
+    return itertools.product(list1, list2)
 
 
-def generate_commit_message(branch_name: str, _hash: Hash) -> str:
+def generate_commit_message(branch_name: str, hashes: Sequence[Hash]) -> str:
     """canned message for commits"""
-    return f"updated summary for hash {_hash} on {branch_name}"
-
-
-def get_matching_logs(
-    cwd: pathlib.Path, _hash: str, job: JobRequest
-) -> List[file.Build]:
-    """finds the build.log files"""
-    logging.debug("fetching matching logs to determine build pass/fail")
-    paths = set(
-        find_files(
-            cwd,
-            [_hash],
-            [
-                "build.log",
-                f"/{sanitize_branch_name(job.branch_name)}/",
-                job.machine_name,
-            ],
-            ["module", "python", "swp"],
-        )
+    joined_hashes = ", ".join(str(x) for x in hashes)
+    return f"updated summary for hash {joined_hashes} on {branch_name}"
+
+
+def matching_rules(job: JobRequest) -> List[Tuple[List[str], List[str]]]:
+    """returns the build.log and summary.dat file name rules for job"""
+    branch_dir = f"/{sanitize_branch_name(job.branch_name)}/"
+    return [
+        (["build.log", branch_dir, job.machine_name], ["module", "python", "swp"]),
+        (["summary.dat", branch_dir, job.machine_name], ["swp"]),
+    ]
+
+
+def get_matching_logs_and_summaries(
+    cwd: pathlib.Path,
+    _hash: str,
+    job: JobRequest,
+    _candidates: Optional[List[List[str]]] = None,
+) -> Tuple[List[file.Build], List[file.Summary]]:
+    """finds the build.log and summary.dat files in a single walk
+
+    _candidates may hold the cached filter_files_by_rules results for
+    matching_rules(job)
+    """
+    logging.debug("fetching matching logs and summaries")
+    log_paths, summary_paths = find_files_by_rules(
+        cwd, [_hash], matching_rules(job), _candidates
     )
-    return [file.Build(pathlib.Path(path)) for path in paths]
-
-
-def get_matching_summaries(
-    cwd: pathlib.Path, _hash: str, job: JobRequest
-) -> List[file.Summary]:
-    """finds the summary.dat files"""
-    logging.debug("fetching matching summaries to extract test results")
-    paths = set(
-        find_files(
-            cwd,
-            [_hash],
-            [
-                "summary.dat",
-                f"/{sanitize_branch_name(job.branch_name)}/",
-                job.machine_name,
-            ],
-            ["swp"],
-        )
+    return (
+        [file.Build(pathlib.Path(path)) for path in set(log_paths)],
+        [file.Summary(pathlib.Path(path)) for path in set(summary_paths)],
     )
-    return [file.Summary(pathlib.Path(path)) for path in paths]
 
 
-def find_files(
+def find_files_by_rules(
     _root_path: pathlib.Path,
-    value_search_strings: Union[None, List[str]] = None,
-    file_name_search_strings: Union[None, List[str]] = None,
-    file_name_ignore_strings: Union[None, List[str]] = None,
-) -> List[str]:
-    """finds files containing all values_search_strings where file path
-    includes file_name_search_strings but does not contain any
-    file_name_ignore_strings"""
+    value_search_strings: List[str],
+    rules: Sequence[Tuple[List[str], List[str]]],
+    _candidates: Optional[List[List[str]]] = None,
+) -> List[List[str]]:
+    """finds files containing all value_search_strings whose path includes
+    every file_name_search_string and no file_name_ignore_string of a
+    (file_name_search_strings, file_name_ignore_strings) rule, for several
+    rules at once, walking the tree and scanning each file's contents only
+    once; returns one result list per rule
+
+    _candidates may hold a cached filter_files_by_rules(walk_artifacts(
+    _root_path), rules) to reuse.
+    """
 
     if not os.path.exists(_root_path):
         raise ValueError(f"{_root_path} is invalid")
 
-    value_search_strings = (
-        [] if value_search_strings is None else list(value_search_strings)
+    candidates = (
+        filter_files_by_rules(walk_artifacts(_root_path), rules)
+        if _candidates is None
+        else _candidates
     )
-
-    file_name_search_strings = (
-        [] if file_name_search_strings is None else list(file_name_search_strings)
+    matches = match_file_contents(
+        sorted(set(itertools.chain.from_iterable(candidates))), value_search_strings
     )
+    return [
+        [file_path for file_path in matches if file_path in rule_candidates]
+        for rule_candidates in map(set, candidates)
+    ]
 
-    file_name_ignore_strings = (
-        [] if file_name_ignore_strings is None else list(file_name_ignore_strings)
-    )
 
-    results = []
-    for root, _, files in os.walk(_root_path, followlinks=True):
+def filter_files_by_rules(
+    walk: Iterable[Tuple[str, List[str], List[str]]],
+    rules: Sequence[Tuple[List[str], List[str]]],
+) -> List[List[str]]:
+    """returns, per (file_name_search_strings, file_name_ignore_strings)
+    rule, the walked file paths including every search string and none of
+    the ignore strings"""
+    candidates: List[List[str]] = [[] for _ in rules]
+    for root, _, files in walk:
         for _file in files:
             file_path = os.path.join(root, _file)
 
-            has_filename_search_string = len(file_name_search_strings) == 0 or all(
-                search_string in file_path for search_string in file_name_search_strings
-            )
+            for idx, (search_strings, ignore_strings) in enumerate(rules):
+                # the ignore list is shorter, rule files out on it first
+                has_filename_ignore_string = any(
+                    search_string in file_path for search_string in ignore_strings
+                )
+                if has_filename_ignore_string:
+                    continue
 
-            has_filename_ignore_string = any(
-                search_string in file_path for search_string in file_name_ignore_strings
-            )
+                has_filename_search_string = len(search_strings) == 0 or all(
+                    search_string in file_path for search_string in search_strings
+                )
 
-            if has_filename_search_string and not has_filename_ignore_string:
-                file_path = os.path.join(root, file_path)
-                with open(file_path, "r", errors="ignore", encoding="utf-8") as _file:
-                    for line in _file.readlines():
-                        for search_string in value_search_strings:
-                            found = re.compile(f"{search_string}").match(line)
-
-                            if found:
-                                _hash = line.strip()
-                                if tagged_version_match(search_string, _hash):
-                                    logging.debug("matched tagged version %s", _hash)
-                                    bisect.insort(
-                                        results, os.path.join(root, file_path)
-                                    )
-                                if not_tagged_version_match(search_string, _hash):
-                                    logging.debug("matched other version %s", _hash)
-                                    bisect.insort(
-                                        results, os.path.join(root, file_path)
-                                    )
+                if has_filename_search_string:
+                    candidates[idx].append(file_path)
+    return candidates
 
-    return results
+
+def walk_artifacts(
+    _root_path: Union[str, pathlib.Path]
+) -> Generator[Tuple[str, List[str], List[str]], None, None]:
+    """os.walk(_root_path, followlinks=True) without descending into
+    PRUNED_DIR_NAMES"""
+    for root, dirs, files in os.walk(_root_path, followlinks=True):
+        dirs[:] = [_dir for _dir in dirs if _dir not in PRUNED_DIR_NAMES]
+        yield root, dirs, files
+
+
+def match_file_contents(
+    file_paths: List[str], value_search_strings: List[str]
+) -> List[str]:
+    """returns file_paths having a line matching one of value_search_strings,
+    in the order of file_paths"""
+    patterns = [
+        (search_string, re.compile(f"{search_string}"))
+        for search_string in value_search_strings
+    ]
+    # one alternation rules a line out in a single match instead of one per
+    # search string
+    prefilter = (
+        re.compile(
+            "|".join(f"(?:{search_string})" for search_string in value_search_strings)
+        )
+        if len(patterns) > 1
+        else None
+    )
+    return [
+        file_path
+        for file_path in grep_candidates(file_paths, value_search_strings)
+        if file_has_matching_line(file_path, patterns, prefilter)
+    ]
+
+
+def file_has_matching_line(
+    file_path: str,
+    patterns: List[Tuple[str, Pattern[str]]],
+    prefilter: Optional[Pattern[str]] = None,
+) -> bool:
+    """streams file_path and stops at the first line matching one of the
+    (search_string, compiled search_string) patterns
+
+    prefilter, the alternation of every pattern, skips lines none can match
+    """
+    with open(file_path, "r", errors="ignore", encoding="utf-8") as _file:
+        for line in _file:
+            if prefilter is not None and prefilter.match(line) is None:
+                continue
+            for search_string, pattern in patterns:
+                if pattern.match(line) is None:
+                    continue
+                _hash = line.strip()
+                if tagged_version_match(search_string, _hash):
+                    logging.debug("matched tagged version %s", _hash)
+                    return True
+                if not_tagged_version_match(search_string, _hash):
+                    logging.debug("matched other version %s", _hash)
+                    return True
+    return False
+
+
+def grep_candidates(file_paths: List[str], search_strings: List[str]) -> List[str]:
+    """narrows file_paths down to the files with a line starting with one of
+    search_strings, using ripgrep (or grep) so non-matching files are never
+    read in python
+
+    Returns file_paths unchanged when neither tool is available or a search
+    string might not mean the same thing to them as it does to python's re.
+    """
+    if not file_paths or not search_strings:
+        return file_paths
+    if not all(_ERE_SAFE_PATTERN.fullmatch(value) for value in search_strings):
+        return file_paths
+    # python also splits lines on a bare carriage return
+    found = files_containing(
+        file_paths, [f"(^|\r){search_string}" for search_string in search_strings]
+    )
+    if found is None:
+        return file_paths
+    # ripgrep reports files in whatever order its threads finish
+    return [file_path for file_path in file_paths if file_path in found]
+
+
+def files_containing(file_paths: List[str], patterns: List[str]) -> Optional[Set[str]]:
+    """returns the file_paths having a line matching one of the POSIX ERE
+    patterns, searched natively in batches of GREP_BATCH_SIZE files, or None
+    if neither ripgrep nor grep is installed or a search fails"""
+    cmd = content_search_command(patterns)
+    if cmd is None:
+        return None
+
+    found = set()
+    for idx in range(0, len(file_paths), GREP_BATCH_SIZE):
+        completed = subprocess.run(
+            [*cmd, "--", *file_paths[idx : idx + GREP_BATCH_SIZE]],
+            stdout=subprocess.PIPE,
+            env={**os.environ, "LC_ALL": "C"},
+            check=False,
+        )
+        if completed.returncode > 1:
+            return None
+        found.update(
+            os.fsdecode(line) for line in completed.stdout.split(b"\n") if line
+        )
+    return found
+
+
+def content_search_command(patterns: List[str]) -> Optional[List[str]]:
+    """returns the command listing the files given to it that have a line
+    matching one of the POSIX ERE patterns, preferring the multithreaded
+    ripgrep over grep, or None if neither is installed"""
+    if shutil.which("rg") is not None:
+        # byte oriented like grep under LC_ALL=C, no user config
+        cmd = ["rg", "--files-with-matches", "--text", "--no-messages", "--no-config"]
+        prefix = "(?-u)"
+    elif shutil.which("grep") is not None:
+        cmd = ["grep", "-l", "-a", "-s", "-E"]
+        prefix = ""
+    else:
+        return None
+    for pattern in patterns:
+        cmd += ["-e", f"{prefix}{pattern}"]
+    return cmd
 
 
 def tagged_version_match(search_string, match) -> bool:
@@ -553,8 +988,7 @@ def extract_branch_from_log_line(value: str) -> str:
     ex: 6a3214af0e61 update for test of gfortran_8.3.0_mpiuni_O_develop with hash v8.3.0b08-5-g64eb133 on discover [ci skip] -> develop
 
     """
-    pattern = r"(_[Og]_)(.*)(\swith.*)"
-    result = re.search(pattern, value)
+    result = _LOG_LINE_BRANCH_PATTERN.search(value)
     if result is not None:
         return result.group(2)
     return ""
@@ -562,23 +996,34 @@ def extract_branch_from_log_line(value: str) -> str:
 
 def extract_build_passing_results(
     log_paths: List[file.Build],
+    executor: Optional[concurrent.futures.Executor] = None,
 ) -> Dict[JobAttributes, Tuple[bool, str, str]]:
     """searches through logs to find build_passing results
 
-    JobAttributes namedtuple is immutable so it can be used as a dict key
+    JobAttributes namedtuple is immutable so it can be used as a dict key;
+    the logs are scanned on executor when one is given
     """
 
-    results = {}
-    for _file in log_paths:
-        _path = pathlib.Path(_file.file_path)
-        job_attributes = fetch_job_attributes(_path)
-        results[job_attributes] = fetch_build_file_attributes(_path)
-    return results
+    paths = [pathlib.Path(_file.file_path) for _file in log_paths]
+    # one native search finds the passing logs up front, so python stops
+    # reading each log once its netcdf versions are found
+    passing = files_containing(
+        [str(_path) for _path in paths], [file.Build.SUCCESS_MESSAGE]
+    )
+    passed = [None if passing is None else str(_path) in passing for _path in paths]
+    if executor is None or len(paths) <= 1:
+        scanned = map(fetch_build_file_attributes, paths, passed)
+    else:
+        scanned = executor.map(
+            fetch_build_file_attributes, paths, passed, chunksize=SCAN_CHUNK_SIZE
+        )
+    return dict(zip(map(fetch_job_attributes, paths), scanned))
 
 
 def fetch_job_attributes(_path: pathlib.Path) -> JobAttributes:
     """returns job attributes based on position in path"""
-    result = os.path.normpath(_path).split(os.sep)
+    # only the last nine components are used
+    result = os.path.normpath(_path).rsplit(os.sep, 9)
     return JobAttributes(
         *[result[x].lower().replace("out", "") for x in range(-9, -2, 1)]
     )
@@ -589,31 +1034,41 @@ BuildData = collections.namedtuple(
 )
 
 
-def fetch_build_file_attributes(file_path: pathlib.Path) -> "BuildData":
-    """returns tupe of (build_passing, netcdf_c, netcdf_f)"""
+def fetch_build_file_attributes(
+    file_path: pathlib.Path, passed: Optional[bool] = None
+) -> "BuildData":
+    """returns tupe of (build_passing, netcdf_c, netcdf_f)
+
+    passed, when already known, saves looking for the success message
+    """
     version_pattern = re.compile(r"\d{1,}\.\d{1,}\.\d{1,}")
     if not os.path.exists(file_path):
         logging.error("file path does not exist [%s]", file_path)
         raise FileNotFoundError
-    passing = False
-    netcdf_c = ""
-    netcdf_f = ""
+    passing = bool(passed)
+    # nothing left to look for once passing is known and both versions found
+    settled = passed is not None
+    netcdf_c = None
+    netcdf_f = None
+    # streamed front to back, the first version line of each kind wins
     with open(file_path, "r", encoding="utf-8") as _file:
-        for line in reversed(list(_file)):
-            if "ESMF library built successfully" in line:
-                passing = True
-            if "NetCDF library version:".lower() in line.lower():
+        for line in _file:
+            if not settled and "ESMF library built successfully" in line:
+                passing = settled = True
+            if netcdf_c is not None and netcdf_f is not None:
+                continue
+            # lowered once for both version checks
+            lowered = line.lower()
+            if netcdf_c is None and "netcdf library version:" in lowered:
                 results = version_pattern.search(line.strip())
-                if results is None:
-                    netcdf_c = ""
-                else:
-                    netcdf_c = results.group(0)
-            if "NetCDF Fortran version:".lower() in line.lower():
+                netcdf_c = "" if results is None else results.group(0)
+            if netcdf_f is None and "netcdf fortran version:" in lowered:
                 results = version_pattern.search(line.strip())
-                if results is None:
-                    netcdf_f = ""
-                else:
-                    netcdf_f = results.group(0)
+                netcdf_f = "" if results is None else results.group(0)
+            if settled and netcdf_c is not None and netcdf_f is not None:
+                break
+    netcdf_c = "" if netcdf_c is None else netcdf_c
+    netcdf_f = "" if netcdf_f is None else netcdf_f
     return BuildData(passing, netcdf_c, netcdf_f)
 
 
@@ -641,124 +1096,105 @@ def is_build_passing(file_path: pathlib.Path) -> bool:
 
 def extract_build_attributes(line, file_path) -> Dict[str, Any]:
     """extracs build atrributes when found in file_path"""
-    _temp = {}
-    results = collections.OrderedDict()
-    line_cleaned = line.split("=", 1)[1].strip()
-    group1, group2 = line_cleaned.split(",", 1)
     try:
-
-        (
-            group1,
-            group2,
-        ) = line_cleaned.split(",", 1)
-
-        (
-            _temp["compiler"],
-            _temp["c_version"],
-            _temp["mpi"],
-            _temp["o_g"],
-        ) = group1.strip().split("_")[0:4]
-
-        (_temp["branch"],) = group1.strip().split("_", 4)[4:]
-
-        (
-            _,
-            _,
-            _temp["m_version"],
-            _,
-            _temp["host"],
-            _,
-            _temp["os"],
-        ) = group2.strip().split(" ")
-
-        # Keeps the order of insertion for printing
-        results["branch"] = _temp["branch"]
-        results["host"] = _temp["host"]
-        results["compiler"] = _temp["compiler"]
-        results["c_version"] = _temp["c_version"]
-        results["mpi"] = _temp["mpi"]
-        results["m_version"] = _temp["m_version"].lower()
-        results["o_g"] = _temp["o_g"]
-        results["os"] = _temp["os"]
-
-        return results
-
+        return file.extract_build_attributes(line)
     except ValueError:
-        logging.error("group1: %s", group1)
-        logging.error("group2: %s", group2)
         logging.error("file_path: %s", file_path)
-        logging.error("could not split %s on ", line_cleaned)
         raise
 
 
 def fetch_test_results(file_path: pathlib.Path) -> Dict[str, Any]:
     """Fetches test results from file_path and returns them as an ordered dict"""
 
-    def clean_value(value):
-        delete_carriage_returns = functools.partial(_replace, "\n", "")
-        return delete_carriage_returns(
-            value.replace("PASS", "").replace("FAIL", "")
-        ).strip()
-
-    with open(file_path, "r", encoding="ISO-8859-1") as _file:
+    # only the marker lines are decoded, everything else stays bytes
+    with open(file_path, "rb") as _file:
         results = {}
-        for line in _file.readlines():
+        seen_build = False
+        seen_test_results = set()
+        for line in _file:
             # Build for = gfortran_10.3.0_mpich3_g_develop, mpi version 8.1.7 on acorn esmf_os: Linux
-            if "Build for" in line:
-                results = extract_build_attributes(line, file_path)
-
-            if "test results" in line:
-
-                key, value = line.split("\t", 1)
-                key_cleaned = key.split(None, 1)[0]
+            if b"Build for" in line:
+                results = extract_build_attributes(
+                    line.decode(constants.DEFAULT_FILE_ENCODING), file_path
+                )
+                seen_build = True
+
+            elif b"test results" in line:
+                decoded = line.decode(constants.DEFAULT_FILE_ENCODING)
+                found = _TEST_RESULTS_PATTERN.match(decoded)
+                if found is not None:
+                    key_cleaned, pass_, fail_ = found.groups()
+                    pass_, fail_ = int(pass_), int(fail_)
+                else:
+                    key, value = decoded.split("\t", 1)
+                    key_cleaned = key.split(None, 1)[0]
+                    pass_, fail_ = parse_test_results_value(
+                        key_cleaned, value, file_path
+                    )
+                results[f"{key_cleaned}_pass"] = pass_
+                results[f"{key_cleaned}_fail"] = fail_
+                seen_test_results.add(key_cleaned)
 
-                try:
-                    value = clean_value(value)
-                    pass_, fail_ = value.split(None, 1)
-                    pass_ = int(pass_.strip())
-                    fail_ = int(fail_.strip())
+            # everything after the results block is environment noise
+            if seen_build and seen_test_results.issuperset(TEST_RESULT_KINDS):
+                break
+    return results
 
-                    results[f"{key_cleaned}_pass"] = pass_
-                    results[f"{key_cleaned}_fail"] = fail_
 
-                except ValueError as err:
-                    logging.error(
-                        "found no numeric %s test results, setting to fail [%s]",
-                        key_cleaned,
-                        file_path,
-                    )
-                    logging.error("message: %s", err)
-                    logging.error("line being parsed: %s", value)
-                    results[f"{key_cleaned}_pass"] = "fail"
-                    results[f"{key_cleaned}_fail"] = "fail"
-    return results
+def parse_test_results_value(
+    key_cleaned: str, value: str, file_path: pathlib.Path
+) -> Tuple[Union[int, str], Union[int, str]]:
+    """parses the (pass, fail) counts of a test results line that does not
+    have the usual PASS n FAIL n layout, both are "fail" if not numeric"""
+    try:
+        value = file.clean_test_results_value(value)
+        pass_, fail_ = value.split(None, 1)
+        return int(pass_.strip()), int(fail_.strip())
+
+    except ValueError as err:
+        logging.error(
+            "found no numeric %s test results, setting to fail [%s]",
+            key_cleaned,
+            file_path,
+        )
+        logging.error("message: %s", err)
+        logging.error("line being parsed: %s", value)
+        return "fail", "fail"
 
 
 def fetch_build_result(
     needle: Dict[str, Any], haystack: Dict[JobAttributes, BuildData]
 ) -> BuildData:
     """searches through they haystack for the needle"""
-    data = {k: needle.get(k, "none").lower() for k in (JobAttributes._fields)}
+    key = JobAttributes._make(
+        needle.get(k, "none").lower() for k in JobAttributes._fields
+    )
     try:
-        build, netcdf_c, netcdf_f = haystack[JobAttributes(**data)]
-        return BuildData(
-            build,
-            constants.NA if netcdf_c == "" else netcdf_c,
-            constants.NA if netcdf_f == "" else netcdf_f,
-        )
-
+        build, netcdf_c, netcdf_f = haystack[key]
     except KeyError:
         return BuildData(False, "unknown", "unknown")
+    return BuildData(
+        build,
+        constants.NA if netcdf_c == "" else netcdf_c,
+        constants.NA if netcdf_f == "" else netcdf_f,
+    )
 
 
-def get_branch_hashes(job, git) -> Sequence[Any]:
-    """Uses git log to determine all unique hashes for a branch_name/[machine_name]"""
-    # TODO Should this have the "--all" flag?
-    result = git.log("--format=%B", f"origin/{job.machine_name}")
+def get_branch_hashes(job, log_lines: Iterable[str]) -> Sequence[Any]:
+    """determines the most recent unique hashes for a branch_name/[machine_name]
+    from the machine's commit message lines, reading only as many as needed"""
     pattern = re.compile(sanitize_branch_name(job.branch_name))
-    _stdout = [
-        line.strip()
-        for line in result.stdout.split("\n")
-        if pattern.search(line) is not None and job.machine_name in line
-    ]
-    return UniqueList((Hash(x) for x in _stdout if Hash(x) != ""))[: job.qty]
+    # the substring test is cheaper than the regex, so it goes first
+    matches = (
+        Hash(line.strip())
+        for line in log_lines
+        if job.machine_name in line and pattern.search(line) is not None
+    )
+    # the log is newest first, stop once qty unique hashes have been seen
+    unique: Dict[Hash, None] = {}
+    for _hash in matches:
+        if _hash != "":
+            unique[_hash] = None
+            if len(unique) >= job.qty:
+                break
+    return UniqueList(unique)[: job.qty]
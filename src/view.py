@@ -47,6 +47,16 @@ class ViewCLI:
                 "number of commits to compile from most recent" "Example --number 10"
             ),
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=None,
+            help=(
+                "number of machines to summarize in parallel. "
+                "Defaults to the number of CPUs. Example --jobs 4"
+            ),
+        )
         parser.add_argument(
             "-l",
             "--log",
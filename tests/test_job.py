@@ -1,7 +1,16 @@
 # pylint: skip-file
 
+import concurrent.futures
+import io
+import os
+import pathlib
+import sys
+
+from src import constants, file, gateway, git, job
 from src.job import UniqueList, Hash
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, call
+
+import pytest
 
 
 def test_hash_parses_without_error_if_correct():
@@ -24,3 +33,236 @@ def test_unique_list():
 #     hash = job.JobHash("EF_8_3_0_beta_snapshot_07")
 #     print(hash())
 #     assert False
+
+
+def test_write_markdown_table():
+    data = [{"branch": "develop", "build": "pass", "netcdf": None}]
+    _file = io.StringIO()
+    job.processor.write_markdown_table(data, _file)
+    assert _file.getvalue().split("\n") == [
+        "|    | branch | build | netcdf |",
+        "|----|--------|-------|--------|",
+        "|  0 | develop | pass |  |",
+        "",
+    ]
+
+
+def test_fetch_test_results():
+    actual = job.processor.fetch_test_results(
+        "./tests/fixtures/summary_data_files/4.0.2/summary.dat"
+    )
+    assert dict(actual) == {
+        "branch": "develop",
+        "host": "orion",
+        "compiler": "gfortran",
+        "c_version": "8.3.0",
+        "mpi": "openmpi",
+        "m_version": "4.0.2",
+        "o_g": "g",
+        "os": "Linux",
+        "unit_pass": 8926,
+        "unit_fail": 0,
+        "system_pass": 49,
+        "system_fail": 0,
+        "example_pass": 80,
+        "example_fail": 0,
+        "nuopc_pass": 50,
+        "nuopc_fail": 0,
+    }
+
+
+def test_fetch_test_results_without_numeric_results():
+    actual = job.processor.fetch_test_results(
+        "./tests/fixtures/summary_data_files/2021.2.0-gcc-9.3.0/summary.dat"
+    )
+    assert actual["m_version"] == "2021.2.0-gcc-9.3.0"
+    assert actual["unit_pass"] == "fail"
+    assert actual["example_fail"] == "fail"
+    assert actual["nuopc_pass"] == 0
+    assert actual["nuopc_fail"] == 50
+
+
+def test_summary_reads_every_line():
+    path = "./tests/fixtures/summary_data_files/4.0.2/summary.dat"
+    summary = file.Summary(pathlib.Path(path))
+    with open(path) as _file:
+        assert list(summary.content) == _file.readlines()
+    assert summary.data == job.processor.fetch_test_results(path)
+
+
+def test_archive_snapshot(tmp_path):
+    archive = gateway.Archive(tmp_path / "summaries.db")
+    assert archive.fetch_snapshot("hera", "develop") is None
+    archive.update_snapshot("hera", "develop", "abc123", 3, 1)
+    archive.update_snapshot("hera", "develop", "def456", 3, 1)
+    assert tuple(archive.fetch_snapshot("hera", "develop")) == ("def456", 3, 1)
+
+    # nested writes join the outer transaction and roll back with it
+    try:
+        with archive.transaction():
+            archive.update_snapshot("hera", "develop", "0a1b2c", 3, 1)
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert tuple(archive.fetch_snapshot("hera", "develop")) == ("def456", 3, 1)
+
+
+def test_archive_persists_on_close(tmp_path):
+    row = {field: "x" for field in gateway.database.SummaryRowData._fields}
+    archive = gateway.Archive(tmp_path / "summaries.db")
+    archive.insert_rows([dict(row, branch_hash="abc123")])
+    archive.update_snapshot("hera", "develop", "def456", 3, 1)
+    archive.close()
+
+    archive = gateway.Archive(tmp_path / "summaries.db")
+    assert [x.row["artifacts_hash"] for x in archive.fetch_rows_by_hash("abc123")] == [
+        "x"
+    ]
+    assert tuple(archive.fetch_snapshot("hera", "develop")) == ("def456", 3, 1)
+    archive.close()
+
+
+def test_skips_unchanged_jobs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = gateway.Archive(tmp_path / "summaries.db")
+    git_artifacts = MagicMock()
+    git_artifacts.rev_parse.return_value = "abc123"
+    compass = MagicMock()
+    compass.get_branch_path.return_value = str(tmp_path)
+    processor = job.processor.Processor(
+        ["hera"],
+        ["develop"],
+        3,
+        job.processor.BranchSummaryGateway(
+            git_artifacts, MagicMock(), archive, compass
+        ),
+        workers=1,
+    )
+    processor.write_summaries = MagicMock()
+    processor.collect_summaries = MagicMock(return_value=[])
+    request = job.processor.JobRequest("hera", "develop", 3)
+
+    # a job without summaries is not recorded and runs again
+    processor.generate_summaries(request)
+    processor.generate_summaries(request)
+    assert processor.collect_summaries.call_count == 2
+
+    processor.collect_summaries.return_value = [(0, "v8.3.0", [{}])]
+    processor.generate_summaries(request)
+    processor.generate_summaries(request)
+    assert processor.collect_summaries.call_count == 3
+
+    # new artifacts, another qty or another version invalidate the snapshot
+    assert not processor.is_up_to_date(request, "def456")
+    assert not processor.is_up_to_date(request._replace(qty=5), "abc123")
+    monkeypatch.setattr(constants, "SNAPSHOT_VERSION", constants.SNAPSHOT_VERSION + 1)
+    assert not processor.is_up_to_date(request, "abc123")
+
+
+def test_run_jobs_in_worktrees_records_each_machine(tmp_path, monkeypatch):
+    archive = gateway.Archive(tmp_path / "summaries.db")
+    git_artifacts = MagicMock()
+    git_artifacts.rev_parse.side_effect = lambda ref: f"{ref}-head"
+    processor = job.processor.Processor(
+        ["hera", "orion"],
+        ["develop"],
+        3,
+        job.processor.BranchSummaryGateway(
+            git_artifacts, MagicMock(), archive, MagicMock()
+        ),
+        workers=2,
+    )
+    processor.write_summaries = MagicMock()
+    archive.update_snapshot(
+        "orion", "develop", "origin/orion-head", 3, constants.SNAPSHOT_VERSION
+    )
+
+    def collect_machine_summaries(machine_name, branches, qty, *_):
+        return [
+            (
+                job.processor.JobRequest(machine_name, branch_name, qty),
+                [(0, "v8.3.0", [{}])],
+            )
+            for branch_name in branches
+        ]
+
+    monkeypatch.setattr(
+        job.processor, "collect_machine_summaries", collect_machine_summaries
+    )
+    monkeypatch.setattr(
+        concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor
+    )
+    processor.run_jobs_in_worktrees()
+
+    # orion is up to date and never collected, hera is written and recorded
+    hera = job.processor.JobRequest("hera", "develop", 3)
+    processor.write_summaries.assert_called_once_with(hera, [(0, "v8.3.0", [{}])])
+    assert tuple(archive.fetch_snapshot("hera", "develop")) == (
+        "origin/hera-head",
+        3,
+        constants.SNAPSHOT_VERSION,
+    )
+
+
+def test_collect_machine_summaries_cleans_up_worktree(tmp_path, monkeypatch):
+    git = MagicMock()
+    git.return_value.worktree_add.side_effect = lambda _path, _: os.makedirs(_path)
+    monkeypatch.setattr(job.processor, "Git", git)
+    compass = job.processor.Compass(tmp_path, "artifacts")
+    worktree_path = tmp_path / "worktrees" / "hera"
+    # left over from an earlier run
+    worktree_path.mkdir(parents=True)
+    repopaths = []
+
+    def collect_summaries(self, request):
+        repopaths.append(self.gateway.compass.repopath)
+        return [(0, "v8.3.0", [{}])]
+
+    monkeypatch.setattr(job.processor.Processor, "collect_summaries", collect_summaries)
+    actual = job.processor.collect_machine_summaries(
+        "hera", ["develop"], 3, compass, str(tmp_path / "worktrees")
+    )
+    assert actual == [
+        (job.processor.JobRequest("hera", "develop", 3), [(0, "v8.3.0", [{}])])
+    ]
+    assert git.call_args_list == [call(compass.repopath), call(worktree_path)]
+    git.return_value.worktree_add.assert_called_once_with(worktree_path, "origin/hera")
+    assert repopaths == [worktree_path]
+    assert not worktree_path.exists()
+    assert git.return_value.worktree_prune.call_count == 2
+
+    # a failing job still removes the worktree
+    def fail(self, request):
+        raise RuntimeError
+
+    monkeypatch.setattr(job.processor.Processor, "collect_summaries", fail)
+    with pytest.raises(RuntimeError):
+        job.processor.collect_machine_summaries(
+            "hera", ["develop"], 3, compass, str(tmp_path / "worktrees")
+        )
+    assert not worktree_path.exists()
+    assert git.return_value.worktree_prune.call_count == 4
+
+
+def test_command_stream_with_large_stderr(tmp_path):
+    # more stderr than a pipe buffer holds, written before any stdout
+    script = "import sys; sys.stderr.write('x' * 1000000); print('a'); print('b')"
+    repo = git.Git(tmp_path)
+    assert list(repo._command_stream([sys.executable, "-c", script])) == ["a", "b"]
+    with pytest.raises(git.GitError) as error:
+        list(repo._command_stream([sys.executable, "-c", script + "; sys.exit(1)"]))
+    assert len(str(error.value)) == 1000000
+
+
+def test_grep_candidates(tmp_path):
+    paths = []
+    for name, content in [
+        ("a", "noise\nv8.3.0b07-12-g8913088\n"),
+        ("b", "noise v8.3.0b07-12-g8913088\n"),
+        ("c", "noise\rv8.3.0b07-12-g8913088\n"),
+    ]:
+        (tmp_path / name).write_text(content)
+        paths.append(str(tmp_path / name))
+    actual = job.processor.grep_candidates(paths, ["v8.3.0b07-12-g8913088"])
+    assert sorted(actual) == [paths[0], paths[2]]
+    assert job.processor.grep_candidates(paths, ["v8(3)"]) == paths
@@ -1,8 +1,6 @@
 # pylint: skip-file
 
-import pathlib
-from src import git, job
-from unittest.mock import MagicMock
+from src import job
 
 
 def test_example():
@@ -10,22 +8,8 @@ def test_example():
 
 
 def test_fetch_branches():
-    class MockClz:
-        """mock"""
-
-        def __init__(self, data):
-            self.data = data
-
-        @property
-        def stdout(self):
-            return self.data
-
-    clz = None
     with open("./tests/fixtures/git_lot.txt") as _file:
-        clz = MockClz(_file.read())
-
-    _git = git.Git(pathlib.Path("."))
-    _git.log = MagicMock(return_value=clz)
+        log_lines = _file.read().split("\n")
 
     _job = job.JobRequest(machine_name="cheyenne", branch_name="develop", qty=5)
 
@@ -37,5 +21,20 @@ def test_fetch_branches():
         "ESMF_8_3_0_beta_snapshot_05-30-gf84ebe0",
     ]
 
-    actual = job.processor.get_branch_hashes(_job, _git)
+    actual = job.processor.get_branch_hashes(_job, log_lines)
     assert actual == expected
+
+
+def test_fetch_branches_stops_at_qty():
+    with open("./tests/fixtures/git_lot.txt") as _file:
+        log_lines = iter(_file.read().split("\n"))
+
+    _job = job.JobRequest(machine_name="cheyenne", branch_name="develop", qty=2)
+
+    actual = job.processor.get_branch_hashes(_job, log_lines)
+    assert actual == [
+        "ESMF_8_3_0_beta_snapshot_06-10-gce27d44",
+        "ESMF_8_3_0_beta_snapshot_06-9-gd3f8b21",
+    ]
+    # the rest of the log is left unread
+    assert len(list(log_lines)) > 0